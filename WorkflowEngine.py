@@ -1,6 +1,15 @@
+import os
+import json
+import time
+import random
+import hashlib
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import geopandas as gpd
+import shapely
 from geopy.distance import geodesic as GD
+from statistics import NormalDist
 import snowflake.connector
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -9,7 +18,78 @@ class DataExtactionEngine:
     def __init__(self):
         pass
 
-    def get_snowflake_SN2BG(self,username,password,sensor_list, gtw_list, date_range):
+    def fetch_arrow_df(self, cur):
+        '''
+        Fetches the query results as Arrow batches and hands them to pandas without per-value conversion.
+        Numeric columns stay numeric as Arrow-backed dtypes, and ID columns are dictionary encoded into categoricals.
+        
+        Parameters:
+        - cur: Snowflake cursor on which the query was executed.
+        
+        Returns:
+        - A pandas DataFrame with lower-case column names (empty if the query returned no rows).
+        '''
+        batches = list(cur.fetch_arrow_batches())
+
+        if not batches:
+            return pd.DataFrame()
+
+        # Concatenating tables only references the batch buffers, nothing is copied here
+        table = pa.concat_tables(batches)
+        table = table.rename_columns([col.lower() for col in table.column_names])
+
+        # Dictionary encode the repeated ID strings
+        for col in ['sensor_id', 'bgtw_id', 'mgtw_nr']:
+            i = table.schema.get_field_index(col)
+            table = table.set_column(i, col, table.column(col).dictionary_encode())
+
+        # Dictionaries become pandas categoricals and timestamps datetime64 (needed by pd.Grouper), the rest stays Arrow-backed
+        def types_mapper(pa_type):
+            if pa.types.is_dictionary(pa_type) or pa.types.is_timestamp(pa_type):
+                return None
+            return pd.ArrowDtype(pa_type)
+
+        return table.to_pandas(types_mapper=types_mapper)
+
+    def connect_snowflake(self, username, password):
+        '''
+        Opens a connection to the Dryad Snowflake warehouse.
+        
+        Parameters:
+        - username: Snowflake username for authentication.
+        - password: Snowflake password for authentication.
+        
+        Returns:
+        - An open Snowflake connection.
+        '''
+        return snowflake.connector.connect(
+            user=username,
+            password=password,
+            account='bo02374.eu-central-1',
+            warehouse='DRYAD_WH'
+        )
+
+    def build_sample_str(self, sample_rate):
+        '''
+        Builds the Snowflake SAMPLE clause for a quick-look extraction.
+        Row (Bernoulli) sampling keeps every row with the same probability, so means and scaled counts stay unbiased.
+        
+        Parameters:
+        - sample_rate: Fraction of rows to sample (0-1], or None for a full extraction.
+        
+        Returns:
+        - The SAMPLE clause (empty for a full extraction), or None if the rate is out of range.
+        '''
+        if sample_rate is None:
+            return ""
+
+        if not 0 < sample_rate <= 1:
+            print("Error: Sample rate is out of range, please choose a fraction between 0 and 1")
+            return None
+
+        return f"SAMPLE BERNOULLI ({sample_rate*100:g})"
+
+    def get_snowflake_SN2BG(self,username,password,sensor_list, gtw_list, date_range, arrow=False, sample_rate=None, time_operators=None, con=None):
         '''
         Extracts SN to BG data from Snowflake based on the provided sensor list, gateway list, and date range.
         
@@ -19,11 +99,21 @@ class DataExtactionEngine:
         - sensor_list: List of sensor IDs.
         - gtw_list: List of gateway IDs (either as strings or integers).
         - date_range: List of two dates specifying the start and end of the range.
+        - arrow: Optional; if True, fetches the data through Arrow with typed, dictionary-encoded columns.
+        - sample_rate: Optional; fraction of rows (0-1] sampled server-side for a quick-look extraction.
+        - time_operators: Optional; pair of comparison operators for the start and end dates, overriding the defaults.
+        - con: Optional; open Snowflake connection to run the query on, left open. By default a connection is opened and closed.
         
         Returns:
         - A pandas DataFrame containing the extracted data.
         '''
-        operator = ['>=','<=']
+        operator = ['>=','<='] if time_operators is None else time_operators
+
+        # Build the optional server-side sampling clause
+        sample_str = self.build_sample_str(sample_rate)
+
+        if sample_str is None:
+            return None
 
         # Convert sensor list to a SQL-compatible string with LIKE conditions
         sensor_like_str = " OR ".join([f"ENDDEVICE:id LIKE '%{sensor_id}%'" for sensor_id in sensor_list])
@@ -54,7 +144,7 @@ class DataExtactionEngine:
             FRAMECOUNT AS frameCount,
             FRAMEPORT AS framePort
         FROM 
-            DRYAD_HQ.DRYAD.SENSOR_MESSAGES_ID
+            DRYAD_HQ.DRYAD.SENSOR_MESSAGES_ID {sample_str}
         WHERE 
             ({sensor_like_str})
             AND ({time_str})
@@ -66,20 +156,25 @@ class DataExtactionEngine:
             
         ;"""
 
-        # Connect to Snowflake
-        con = snowflake.connector.connect(
-            user=username,
-            password=password,
-            account='bo02374.eu-central-1',
-            warehouse='DRYAD_WH'
-        )
+        # Connect to Snowflake, unless an open connection is passed in
+        own_con = con is None
+        if own_con:
+            con = self.connect_snowflake(username, password)
+
+        try:
+            # Execute the query
+            cur = con.cursor()
+            cur.execute(query)
 
-        # Execute the query
-        cur = con.cursor()
-        cur.execute(query)
+            # Fetch all results into a DataFrame
+            if arrow:
+                df = self.fetch_arrow_df(cur)
+            else:
+                df = cur.fetch_pandas_all()
 
-        # Fetch all results into a DataFrame
-        df = cur.fetch_pandas_all()
+        finally:
+            if own_con:
+                con.close()
 
         if df.empty:
             print("Error: The query returned an empty DataFrame. No data found for the given parameters.")
@@ -92,7 +187,164 @@ class DataExtactionEngine:
 
 
 
-    def get_snowflake_SN2MG(self,username,password,sensor_list,gtw_list,date_range):
+    def get_snowflake_chunked(self, username, password, sensor_list, gtw_list, date_range, gtw_type, checkpoint_dir,
+                              window='1D', shard_size=25, max_retries=5, backoff_s=2.0, max_backoff_s=60.0, arrow=False, sample_rate=None):
+        '''
+        Extracts SN to BG or SN to MG data in chunks of date window and sensor shard, checkpointing each completed chunk
+        to local storage with a manifest. On a retry, completed chunks are reused and only the missing ones are fetched,
+        each with a bounded exponential backoff on transient failures.
+        
+        Parameters:
+        - username: Snowflake username for authentication.
+        - password: Snowflake password for authentication.
+        - sensor_list: List of sensor IDs.
+        - gtw_list: List of gateway IDs (either as strings or integers).
+        - date_range: List of two dates specifying the start and end of the range.
+        - gtw_type: 0 for BG, and 1 for MG.
+        - checkpoint_dir: Directory to store the chunks and the manifest in.
+        - window: Optional; length of the date window of a chunk (e.g., '1D', '12h').
+        - shard_size: Optional; number of sensors per chunk.
+        - max_retries: Optional; number of attempts per chunk before giving up (at least 1).
+          Only transient failures are retried, programming errors such as bad SQL or credentials fail at once.
+        - backoff_s: Optional; delay before the first retry, doubled on every following retry.
+        - max_backoff_s: Optional; upper bound of the retry delay.
+        - arrow: Optional; if True, fetches the data through Arrow with typed, dictionary-encoded columns.
+        - sample_rate: Optional; fraction of rows (0-1] sampled server-side for a quick-look extraction.
+        
+        Returns:
+        - A tuple of (pandas DataFrame containing the extracted data, pandas DataFrame reporting the status of each chunk).
+        '''
+        if max_retries < 1:
+            print("Error: max_retries must be at least 1.")
+            return None, None
+
+        if gtw_type == 0:
+            extract, operator = self.get_snowflake_SN2BG, ['>=','<=']
+        else:
+            extract, operator = self.get_snowflake_SN2MG, ['>','<']
+
+        # Checkpoints of different queries live in different folders, so a changed query never reuses stale chunks
+        query = dict(sensor_list=list(sensor_list), gtw_list=list(gtw_list), date_range=[str(date) for date in date_range], gtw_type=gtw_type,
+                     window=window, shard_size=shard_size, arrow=arrow, sample_rate=sample_rate)
+        query_hash = hashlib.sha1(json.dumps(query, sort_keys=True).encode()).hexdigest()[:12]
+        query_dir = os.path.join(checkpoint_dir, query_hash)
+        os.makedirs(query_dir, exist_ok=True)
+
+        manifest_path = os.path.join(query_dir, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        else:
+            manifest = {'query': query, 'chunks': {}}
+
+        # Split the date range into windows, inner boundaries belong to the later window only.
+        # Anchored windows (e.g. 'W', 'MS') start at the first anchor after the start, so the start is always an edge
+        start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+        edges = [start] + [edge for edge in pd.date_range(start, end, freq=window) if edge > start]
+        if edges[-1] < end:
+            edges.append(end)
+
+        windows = []
+        for i in range(len(edges) - 1):
+            start_op = operator[0] if i == 0 else '>='
+            end_op = operator[1] if i == len(edges) - 2 else '<'
+            windows.append((edges[i], edges[i + 1], [start_op, end_op]))
+
+        shards = [sensor_list[i:i + shard_size] for i in range(0, len(sensor_list), shard_size)]
+
+        frames = []
+        report = []
+
+        # One connection for all chunks, closed however the extraction ends
+        con = None
+        try:
+            for window_start, window_end, time_operators in windows:
+                for shard_nr, shard in enumerate(shards):
+                    chunk_id = f"{window_start:%Y%m%dT%H%M%S}_{window_end:%Y%m%dT%H%M%S}_s{shard_nr:03d}"
+                    chunk = manifest['chunks'].get(chunk_id)
+
+                    # Reuse a completed chunk if its file is still there
+                    if chunk is not None and (chunk['file'] is None or os.path.exists(os.path.join(query_dir, chunk['file']))):
+                        if chunk['file'] is not None:
+                            frames.append(pd.read_parquet(os.path.join(query_dir, chunk['file'])))
+                        report.append({'chunk_id': chunk_id, 'status': 'reused', 'rows': chunk['rows'], 'attempts': 0})
+                        continue
+
+                    chunk_range = [f"{window_start:%Y-%m-%d %H:%M:%S}", f"{window_end:%Y-%m-%d %H:%M:%S}"]
+
+                    for attempt in range(1, max_retries + 1):
+                        try:
+                            if con is None:
+                                con = self.connect_snowflake(username, password)
+
+                            chunk_df = extract(username, password, shard, gtw_list, chunk_range, arrow=arrow, sample_rate=sample_rate, time_operators=time_operators, con=con)
+                            break
+
+                        except snowflake.connector.errors.ProgrammingError:
+                            # Bad SQL or credentials do not go away by retrying
+                            raise
+
+                        except (snowflake.connector.errors.DatabaseError, OSError) as e:
+                            # The session may be broken, open a fresh one for the next attempt
+                            if con is not None:
+                                con.close()
+                                con = None
+
+                            if attempt == max_retries:
+                                print(f"Error: Chunk {chunk_id} failed after {max_retries} attempts, rerun to resume from the completed chunks.")
+                                raise
+
+                            # Bounded exponential backoff with jitter
+                            delay = min(max_backoff_s, backoff_s * 2**(attempt - 1)) * random.uniform(0.5, 1)
+                            print(f"Warning: Chunk {chunk_id} failed ({e}), retrying in {delay:.1f} s.")
+                            time.sleep(delay)
+
+                    # Write the chunk and the manifest through temporary files, so an interruption never leaves them half written
+                    if chunk_df is None:
+                        chunk_file, rows = None, 0
+                    else:
+                        chunk_file, rows = f"{chunk_id}.parquet", len(chunk_df)
+                        chunk_df.to_parquet(os.path.join(query_dir, chunk_file + '.tmp'))
+                        os.replace(os.path.join(query_dir, chunk_file + '.tmp'), os.path.join(query_dir, chunk_file))
+                        frames.append(chunk_df)
+
+                    manifest['chunks'][chunk_id] = {'file': chunk_file, 'rows': rows, 'date_range': chunk_range, 'sensors': list(shard)}
+                    with open(manifest_path + '.tmp', 'w') as f:
+                        json.dump(manifest, f, indent=2)
+                    os.replace(manifest_path + '.tmp', manifest_path)
+
+                    report.append({'chunk_id': chunk_id, 'status': 'fetched', 'rows': rows, 'attempts': attempt})
+
+        finally:
+            if con is not None:
+                con.close()
+
+        report_df = pd.DataFrame(report)
+
+        reused = report_df.loc[report_df['status'] == 'reused', 'chunk_id'].tolist()
+        print(f"Reused {len(reused)} of {len(report_df)} chunks from {query_dir}" + (f": {', '.join(reused)}" if reused else "."))
+
+        if not frames:
+            print("Error: The query returned an empty DataFrame. No data found for the given parameters.")
+            return None, report_df
+
+        df = pd.concat(frames, ignore_index=True)
+
+        # Sensor IDs are matched with LIKE, so a shard also returns sensors whose ID contains one of its IDs
+        # (e.g. n34 also matches n342), which may be fetched again by their own shard
+        if len(shards) > 1:
+            df = df.drop_duplicates(subset=['sensor_id', 'timestamp', 'framecount', 'bgtw_id'], ignore_index=True)
+
+        # Chunks carry their own dictionaries, encode the IDs again over the whole result
+        if arrow:
+            for col in ['sensor_id', 'bgtw_id', 'mgtw_nr']:
+                df[col] = df[col].astype('category')
+
+        df = df.sort_values('timestamp', ascending=False, ignore_index=True)
+
+        return df, report_df
+
+    def get_snowflake_SN2MG(self,username,password,sensor_list,gtw_list,date_range, arrow=False, sample_rate=None, time_operators=None, con=None):
         '''
         Extracts SN to MG data from Snowflake based on the provided sensor list and date range.
         
@@ -101,12 +353,22 @@ class DataExtactionEngine:
         - password: Snowflake password for authentication.
         - sensor_list: List of sensor IDs.
         - date_range: List of two dates specifying the start and end of the range.
+        - arrow: Optional; if True, fetches the data through Arrow with typed, dictionary-encoded columns.
+        - sample_rate: Optional; fraction of rows (0-1] sampled server-side for a quick-look extraction.
+        - time_operators: Optional; pair of comparison operators for the start and end dates, overriding the defaults.
+        - con: Optional; open Snowflake connection to run the query on, left open. By default a connection is opened and closed.
         
         Returns:
         - A pandas DataFrame containing the extracted data.
         '''
 
-        operator = ['>','<']
+        operator = ['>','<'] if time_operators is None else time_operators
+
+        # Build the optional server-side sampling clause
+        sample_str = self.build_sample_str(sample_rate)
+
+        if sample_str is None:
+            return None
 
         # Convert sensor list to a SQL-compatible string with LIKE conditions
         sensor_like_str = " OR ".join([f"ENDDEVICE:id LIKE '%{sensor_id}%'" for sensor_id in sensor_list])
@@ -135,7 +397,7 @@ class DataExtactionEngine:
             FRAMECOUNT AS frameCount,
             FRAMEPORT AS framePort
         FROM 
-            DRYAD_HQ.DRYAD.SENSOR_MESSAGES_ID
+            DRYAD_HQ.DRYAD.SENSOR_MESSAGES_ID {sample_str}
         WHERE 
             ({sensor_like_str})
             AND ({time_str})
@@ -146,20 +408,25 @@ class DataExtactionEngine:
             
         ;"""
 
-        # Connect to Snowflake
-        con = snowflake.connector.connect(
-            user=username,
-            password=password,
-            account='bo02374.eu-central-1',
-            warehouse='DRYAD_WH'
-        )
+        # Connect to Snowflake, unless an open connection is passed in
+        own_con = con is None
+        if own_con:
+            con = self.connect_snowflake(username, password)
 
-        # Execute the query
-        cur = con.cursor()
-        cur.execute(query)
+        try:
+            # Execute the query
+            cur = con.cursor()
+            cur.execute(query)
 
-        # Fetch all results into a DataFrame
-        df = cur.fetch_pandas_all()
+            # Fetch all results into a DataFrame
+            if arrow:
+                df = self.fetch_arrow_df(cur)
+            else:
+                df = cur.fetch_pandas_all()
+
+        finally:
+            if own_con:
+                con.close()
 
         if df.empty:
             print("Error: The query returned an empty DataFrame. No data found for the given parameters.")
@@ -167,10 +434,12 @@ class DataExtactionEngine:
             # If the DataFrame is not empty, continue processing
             df.columns = df.columns.str.lower()
 
-            required_columns = ['sensor_long','sensor_lat','mgtw_nr']
+            # The Arrow path keeps coordinates numeric, and 'mgtw_nr' already holds the string values to merge on
+            if not arrow:
+                required_columns = ['sensor_long','sensor_lat','mgtw_nr']
 
-            for col in required_columns:
-                df[col] = df[col].astype(str)
+                for col in required_columns:
+                    df[col] = df[col].astype(str)
 
             return df
 
@@ -308,6 +577,27 @@ class DataCleaningEngine:
 
 
 
+    def process_id_column(self, series, func):
+        '''
+        Applies an ID processing function to a column. For categorical columns only the categories are processed.
+        
+        Parameters:
+        - series: pandas Series of IDs.
+        - func: Function processing a single ID string.
+        
+        Returns:
+        - The processed pandas Series.
+        '''
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Several categories can map to the same processed ID, so re-encode them
+            inverse, uniques = pd.factorize(series.cat.categories.map(func))
+            codes = series.cat.codes.to_numpy()
+            new_codes = np.where(codes >= 0, inverse[codes], -1)
+
+            return pd.Series(pd.Categorical.from_codes(new_codes, uniques), index=series.index, name=series.name)
+
+        return series.apply(func)
+
     def clean_SN2BG(self, df):
         '''
         Cleans the DataFrame by processing the sensor and gateway ID strings.
@@ -318,8 +608,8 @@ class DataCleaningEngine:
         Returns:
         - Cleaned pandas DataFrame.        
         '''
-        df['sensor_id'] = df['sensor_id'].apply(self.process_sensor_string)
-        df['bgtw_id'] = df['bgtw_id'].apply(self.process_bgtw_string)
+        df['sensor_id'] = self.process_id_column(df['sensor_id'], self.process_sensor_string)
+        df['bgtw_id'] = self.process_id_column(df['bgtw_id'], self.process_bgtw_string)
 
         return df  
     
@@ -336,8 +626,8 @@ class DataCleaningEngine:
         sn2mesh_df = self.SN2MG_df_generator()
 
         # Assign mesh list values to 'mgtw.nr' and process 'endDevice.id'
-        df['sensor_id'] = df['sensor_id'].apply(self.process_sensor_string)
-        df['bgtw_id'] = df['bgtw_id'].apply(self.process_bgtw_string)
+        df['sensor_id'] = self.process_id_column(df['sensor_id'], self.process_sensor_string)
+        df['bgtw_id'] = self.process_id_column(df['bgtw_id'], self.process_bgtw_string)
 
         # Filter DataFrame by matching 'mgtw.nr' with the mesh DataFrame
         filtered_df = df.loc[df['mgtw_nr'].isin(sn2mesh_df['mgtw_nr'].tolist())].copy()
@@ -352,6 +642,9 @@ class DataSummaryEngine:
     def __init__(self):
         self.data_cleaning_engine = DataCleaningEngine()
 
+        # Cell polygons already built, keyed by (cell size, reference latitude)
+        self.cell_geometry_cache = {}
+
 
     def count_pckt_error_SN2BG(self, temp_df, freq):
         '''
@@ -377,7 +670,7 @@ class DataSummaryEngine:
         
         missing_packets_dict = {}
         
-        grouped = df.groupby(['sensor_id', 'bgtw_id', 'date'])
+        grouped = df.groupby(['sensor_id', 'bgtw_id', 'date'], observed=True)
         for (sensor_id, bgtw_id, date), group in grouped:
             group = group.sort_values('timestamp')  # Ensure the group is sorted by timestamp
             count = group['framecount'].iloc[0]  # Start with the first framecount
@@ -453,7 +746,7 @@ class DataSummaryEngine:
         missing_packets_dict = {}
         
         # Group by sensor_id, mgtw_id, and date
-        grouped = df.groupby(['sensor_id', 'mgtw_id', 'date'])
+        grouped = df.groupby(['sensor_id', 'mgtw_id', 'date'], observed=True)
         for (sensor_id, mgtw_id, date), group in grouped:
             group = group.sort_values('timestamp')  # Ensure the group is sorted by timestamp
             count = group['framecount'].iloc[0]  # Start with the first framecount
@@ -503,20 +796,243 @@ class DataSummaryEngine:
         
         return summary_df
 
+    def count_framecount_gaps(self, df, link_cols):
+        '''
+        Counts the packets missing before each message from the framecount sequence of its link, without a Python loop.
+        Resets follow the same rule as count_pckt_error_SN2BG, and the first message of each link has no gap.
+        Gaps are counted across calendar days unless a date column is part of link_cols, which is what
+        count_pckt_error_SN2BG does.
+
+        Parameters:
+        - df: pandas DataFrame containing 'timestamp', 'framecount' and the link columns.
+        - link_cols: Columns identifying a link, e.g. ['sensor_id', 'bgtw_id'].
+
+        Returns:
+        - A numpy array with the number of missing packets before each row, in the original row order.
+        '''
+        # Sort positions by link and time, keeping the original positions to scatter the result back
+        order = np.lexsort([pd.to_datetime(df['timestamp']).to_numpy()] + [pd.factorize(df[col])[0] for col in reversed(link_cols)])
+
+        framecount = df['framecount'].to_numpy(dtype=np.int64)[order]
+        codes = np.column_stack([pd.factorize(df[col])[0][order] for col in link_cols])
+
+        previous = np.roll(framecount, 1)
+        new_link = np.ones(len(order), dtype=bool)
+        new_link[1:] = (codes[1:] != codes[:-1]).any(axis=1)
+
+        # Regular gap, or packets lost before the counter restarted at 4 on a reset
+        gaps = np.where(framecount < previous, np.where(framecount == 4, 1, framecount - 4 - 1), framecount - previous - 1)
+        gaps = np.clip(gaps, 0, None)
+        gaps[new_link] = 0
+
+        missing = np.empty(len(order), dtype=np.int64)
+        missing[order] = gaps
+
+        return missing
+
+    def estimate_expected_pckts(self, df, freq, gtw_col='bgtw_id', date_range=None):
+        '''
+        Estimates the packets each link should have received per period from the uplink interval of its sensor,
+        so losses at the end of a period and sensors going silent count towards the PER.
+        The interval is the median of timestamp difference over framecount difference between consecutive messages of a
+        sensor, which is robust to jitter and to lost packets.
+        
+        Parameters:
+        - df: pandas DataFrame containing the raw (cleaned) message data.
+        - freq: the frequency at which you want to resample the data (e.g., 'D' for daily).
+        - gtw_col: Gateway column defining the link, 'bgtw_id' for SN2BG or 'mgtw_id' for SN2MG.
+        - date_range: Optional; list of two dates of the observation window, defaults to the span of the data.
+        
+        Returns:
+        - A pandas DataFrame with, per link and period, the received, missing (framecount gaps), silent (no message
+          at all) and expected packets, the uplink interval and the resulting PER.
+        '''
+        # The summary engine moves 'timestamp' to the index, bring it back as a column
+        if 'timestamp' not in df.columns:
+            df = df.reset_index()
+
+        df = df[df['frameport'] != 99]
+        ts = pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        framecount = df['framecount'].to_numpy(dtype=np.int64)
+
+        # Uplink interval per sensor from consecutive messages of the same sensor, across all gateways
+        sensor_codes, sensors = pd.factorize(df['sensor_id'])
+        order = np.lexsort([ts, sensor_codes])
+        same_sensor = sensor_codes[order][1:] == sensor_codes[order][:-1]
+        d_ts = np.diff(ts[order])
+        d_fc = np.diff(framecount[order])
+        valid = same_sensor & (d_fc > 0) & (d_ts > 0)
+        interval_ns = pd.Series(d_ts[valid] / d_fc[valid]).groupby(sensor_codes[order][1:][valid]).median().reindex(range(len(sensors))).to_numpy()
+
+        # Observation window
+        if date_range is None:
+            obs_start, obs_end = ts.min(), ts.max()
+        else:
+            obs_start, obs_end = (pd.Timestamp(date).value for date in date_range)
+
+        # Let pd.Grouper assign the periods, exactly as in the summaries. The end of the observation window is
+        # appended so the periods after the last message are created too. A time grouper returns ngroup in sorted
+        # timestamp order, so realign it with the rows (Snowflake returns them newest first)
+        grouper = pd.Grouper(key='timestamp', freq=freq)
+        stamps = pd.DataFrame({'timestamp': np.append(ts, max(ts.max(), obs_end)).view('datetime64[ns]')})
+        grouped = stamps.groupby(grouper)
+        period = grouped.ngroup().reindex(stamps.index).to_numpy()[:-1]
+        labels = grouped.size().index
+
+        # Bin edges of each period, right-closed bins of non-Tick frequencies ('W', 'ME', ...) are stretched by
+        # pandas to the end of the label day
+        offset = pd.tseries.frequencies.to_offset(freq)
+        if grouper.label == 'right':
+            starts, ends = labels - offset, labels
+        else:
+            starts, ends = labels, labels + offset
+
+        if grouper.closed == 'right' and not isinstance(offset, pd.offsets.Tick):
+            starts, ends = starts + pd.Timedelta(days=1), ends + pd.Timedelta(days=1)
+
+        starts = np.clip(starts.to_numpy(dtype='datetime64[ns]').view(np.int64), obs_start, None)
+        ends = np.clip(ends.to_numpy(dtype='datetime64[ns]').view(np.int64), None, obs_end)
+
+        # Received packets, framecount gaps inside the period, and first and last message per link and period
+        gtw_codes, gtws = pd.factorize(df[gtw_col])
+        link_codes, link_keys = pd.factorize(sensor_codes * len(gtws) + gtw_codes)
+        link_sensor, link_gtw = link_keys // len(gtws), link_keys % len(gtws)
+        n_periods = len(labels)
+        key = link_codes * n_periods + period
+
+        gap_df = pd.DataFrame({'timestamp': ts, 'framecount': framecount, 'key': key})
+        stats = pd.DataFrame({
+            'key': key,
+            'ts': ts,
+            'missing': self.count_framecount_gaps(gap_df, ['key']),
+        }).groupby('key').agg(
+            pckt_nr=('ts', 'size'),
+            first=('ts', 'min'),
+            last=('ts', 'max'),
+            missing_pckts=('missing', 'sum'),
+        )
+
+        # Every period from the first message of a link onwards, a sensor is not expected before it first reports
+        link_first_period = pd.Series(period).groupby(link_codes).min().to_numpy()
+        link_first_ts = pd.Series(ts).groupby(link_codes).min().to_numpy()
+        period_counts = n_periods - link_first_period
+        grid_link = np.repeat(np.arange(len(link_keys)), period_counts)
+        grid_period = np.arange(period_counts.sum()) - np.repeat(np.cumsum(period_counts) - period_counts, period_counts) + np.repeat(link_first_period, period_counts)
+
+        grid = stats.reindex(grid_link * n_periods + grid_period)
+        received = grid['pckt_nr'].fillna(0).to_numpy()
+        missing = grid['missing_pckts'].fillna(0).to_numpy()
+
+        interval = interval_ns[link_sensor][grid_link]
+        period_start = np.maximum(starts[grid_period], link_first_ts[grid_link])
+        period_end = ends[grid_period]
+
+        # Slots without any message at the start and end of a period, or the whole period if the link was silent
+        with np.errstate(invalid='ignore'):
+            head = np.floor((grid['first'].to_numpy() - period_start) / interval)
+            tail = np.floor((period_end - grid['last'].to_numpy()) / interval)
+            whole = np.rint((period_end - period_start) / interval)
+
+        silent = np.where(received > 0, np.clip(head, 0, None) + np.clip(tail, 0, None), np.clip(whole, 0, None))
+        silent = np.nan_to_num(silent).astype(np.int64)
+
+        expected_df = pd.DataFrame({
+            'sensor_id': sensors[link_sensor][grid_link],
+            gtw_col: gtws[link_gtw][grid_link],
+            'timestamp': labels[grid_period],
+            'pckt_nr': received.astype(np.int64),
+            'missing_pckts': missing.astype(np.int64),
+            'silent_pckts': silent,
+        })
+
+        expected_df['expected_pckts'] = expected_df['pckt_nr'] + expected_df['missing_pckts'] + expected_df['silent_pckts']
+        expected_df['uplink_interval_s'] = round(pd.Series(interval / 1e9), 1)
+
+        # Drop periods cut to nothing by the end of the observation window
+        expected_df = expected_df[expected_df['expected_pckts'] > 0].reset_index(drop=True)
 
+        # Calculate packet loss percentage including outages
+        expected_df['outage_pckt_error_rate'] = round((1 - expected_df['pckt_nr'] / expected_df['expected_pckts'])*100,2)
 
-    def calculate_SN2BG_summary(self, df, freq):
+        return expected_df
+
+
+
+    def merge_expected_pckts(self, summary_df, expected_df, key_cols):
+        '''
+        Adds the expected packets and the PER including outages to a summary, keeping the periods a link stayed silent.
+        
+        Parameters:
+        - summary_df: pandas DataFrame with the summarized metrics.
+        - expected_df: pandas DataFrame returned by estimate_expected_pckts.
+        - key_cols: Columns identifying a link and period in both DataFrames.
+        
+        Returns:
+        - The merged pandas DataFrame.
+        '''
+        expected_cols = ['silent_pckts', 'expected_pckts', 'uplink_interval_s', 'outage_pckt_error_rate']
+
+        # Both sides may carry categorical IDs with different categories, merge on the plain values
+        summary_df = summary_df.astype({col: object for col in key_cols[:-1]})
+        expected_df = expected_df.astype({col: object for col in key_cols[:-1]})
+
+        # Outer merge, so periods without any received message show up with a 100 % outage PER
+        return pd.merge(summary_df, expected_df[key_cols + expected_cols], on=key_cols, how='outer')
+
+    def add_sample_estimates(self, summary_df, sample_rate, confidence=0.95):
+        '''
+        Scales the packet counts of a summary built from sampled data and adds confidence intervals for the means.
+        PER is flagged as unavailable, since sampling breaks the framecount continuity it is computed from.
+        
+        Parameters:
+        - summary_df: pandas DataFrame with 'pckt_nr', the averages, and their '_std' and '_n' helper columns.
+        - sample_rate: Fraction of rows the data was sampled with.
+        - confidence: Confidence level of the intervals.
+        
+        Returns:
+        - The pandas DataFrame with the estimated packet counts and the confidence intervals.
+        '''
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+        # Normal interval of each mean from its sample standard deviation
+        for metric in ['rssi', 'snr']:
+            half_width = z * summary_df[f'{metric}_std'] / np.sqrt(summary_df[f'{metric}_n'])
+            summary_df[f'avg_{metric}_ci_low'] = round(summary_df[f'avg_{metric}'] - half_width, 2)
+            summary_df[f'avg_{metric}_ci_high'] = round(summary_df[f'avg_{metric}'] + half_width, 2)
+
+        summary_df.drop(columns=['rssi_std', 'rssi_n', 'snr_std', 'snr_n'], inplace=True)
+
+        # Each received packet stands for 1 / sample_rate packets
+        summary_df['est_pckts'] = round(summary_df['pckt_nr'] / sample_rate).astype(int)
+
+        summary_df['per_available'] = False
+        summary_df['missing_pckts'] = np.nan
+        summary_df['total_pckts'] = np.nan
+
+        return summary_df
+
+    def calculate_SN2BG_summary(self, df, freq, sample_rate=None, confidence=0.95, include_silent=False, date_range=None):
         '''
         Calculates the summary metrics for SN to BG data, including average RSSI, SNR, and packet error rate (PER).
         
         Parameters:
         - df: pandas DataFrame containing the raw data.
+        - sample_rate: Optional; fraction of rows the data was sampled with, scales the counts and flags PER as unavailable.
+        - confidence: Optional; confidence level of the mean intervals for sampled data.
+        - include_silent: Optional; if True, adds the expected packets from the uplink interval and the PER including
+          silent tails and outages, with a row for every period a link stayed silent.
+        - date_range: Optional; list of two dates of the observation window for the silent-tail estimate.
         
         Returns:
         - A pandas DataFrame with summarized daily metrics.
         '''
 
-        missing_pckt = self.count_pckt_error_SN2BG(df,freq)
+        if sample_rate is None:
+            missing_pckt = self.count_pckt_error_SN2BG(df,freq)
+
+        # Framecounts of sampled data are not continuous, so outages can only be estimated for full extractions
+        if include_silent and sample_rate is None:
+            expected_pckt = self.estimate_expected_pckts(df, freq, gtw_col='bgtw_id', date_range=date_range)
 
         # Convert 'timestamp' to datetime format if it's not already
         df['timestamp'] = pd.to_datetime(df['timestamp'])
@@ -530,27 +1046,45 @@ class DataSummaryEngine:
         group_cols = ['sensor_id', 'bgtw_id']
 
         # Group data by 'sensor_id', 'bgtw_id', and resample daily, then aggregate metrics
-        summary_df = df.groupby(group_cols + [pd.Grouper(freq=freq)]).agg(
+        metrics = dict(
             avg_rssi=('bgtw_rssi', 'mean'),
             avg_snr=('bgtw_snr', 'mean'),
             pckt_nr=('pckt_nr', 'sum'),
-        ).reset_index()
+        )
+
+        # Spread and size of each mean, needed for the confidence intervals of sampled data
+        if sample_rate is not None:
+            metrics.update(
+                rssi_std=('bgtw_rssi', 'std'),
+                rssi_n=('bgtw_rssi', 'count'),
+                snr_std=('bgtw_snr', 'std'),
+                snr_n=('bgtw_snr', 'count'),
+            )
+
+        summary_df = df.groupby(group_cols + [pd.Grouper(freq=freq)], observed=True).agg(**metrics).reset_index()
 
         # Round the 'avg_rssi' and 'avg_snr' values to 2 decimal places
         summary_df['avg_rssi'] = round(summary_df['avg_rssi'], 2)
         summary_df['avg_snr'] = round(summary_df['avg_snr'], 2)
 
-        # Merge the missing packets DataFrame with the original DataFrame
-        merged_df = pd.merge(summary_df, missing_pckt, on=['sensor_id', 'bgtw_id', 'timestamp'], how='left')
+        if sample_rate is None:
+            # Merge the missing packets DataFrame with the original DataFrame
+            merged_df = pd.merge(summary_df, missing_pckt, on=['sensor_id', 'bgtw_id', 'timestamp'], how='left')
 
-        # Calculate total_pckts as the sum of pckt_nr and missing_pckts
-        merged_df['total_pckts'] = merged_df['pckt_nr'] + merged_df['missing_pckts']
+            # Calculate total_pckts as the sum of pckt_nr and missing_pckts
+            merged_df['total_pckts'] = merged_df['pckt_nr'] + merged_df['missing_pckts']
+
+        else:
+            merged_df = self.add_sample_estimates(summary_df, sample_rate, confidence)
 
         merged_df.drop(columns=['pckt_nr'], axis=1, inplace=True)
         
         # Calculate packet loss percentage
         merged_df['pckt_error_rate'] = round((merged_df['missing_pckts'] / merged_df['total_pckts'])*100,2)
 
+        if include_silent and sample_rate is None:
+            merged_df = self.merge_expected_pckts(merged_df, expected_pckt, ['sensor_id', 'bgtw_id', 'timestamp'])
+
         return merged_df  # Return the summarized DataFrame
 
 
@@ -578,18 +1112,29 @@ class DataSummaryEngine:
 
         return gdf
 
-    def calculate_SN2MG_summary(self, df, freq):
-        missing_pckt = self.count_pckt_error_SN2MG(df, freq)
+    def calculate_SN2MG_summary(self, df, freq, sample_rate=None, confidence=0.95, include_silent=False, date_range=None):
         '''
         Calculates the summary metrics for SN to MG data, including average RSSI, SNR, packet error rate (PER), 
         and the distance between sensors and mesh gateways.
         
         Parameters:
         - df: pandas DataFrame containing the raw data.
+        - sample_rate: Optional; fraction of rows the data was sampled with, scales the counts and flags PER as unavailable.
+        - confidence: Optional; confidence level of the mean intervals for sampled data.
+        - include_silent: Optional; if True, adds the expected packets from the uplink interval and the PER including
+          silent tails and outages, with a row for every period a link stayed silent.
+        - date_range: Optional; list of two dates of the observation window for the silent-tail estimate.
         
         Returns:
         - A pandas DataFrame with summarized daily metrics and distances.
         '''
+        if sample_rate is None:
+            missing_pckt = self.count_pckt_error_SN2MG(df, freq)
+
+        # Framecounts of sampled data are not continuous, so outages can only be estimated for full extractions
+        if include_silent and sample_rate is None:
+            expected_pckt = self.estimate_expected_pckts(df, freq, gtw_col='mgtw_id', date_range=date_range)
+
         # Convert 'timestamp' to datetime format if it's not already
         df['timestamp'] = pd.to_datetime(df['timestamp'])
         
@@ -602,11 +1147,22 @@ class DataSummaryEngine:
         group_cols = ['sensor_id', 'bgtw_id','mgtw_id', 'sensor_long', 'sensor_lat', 'mgtw_lat', 'mgtw_long']
 
         # Group data by sensor ID and mesh ID, resample daily, and calculate summary metrics
-        summary_df = df.groupby(group_cols + [pd.Grouper(freq=freq)]).agg(
+        metrics = dict(
             avg_rssi=('bgtw_rssi', 'mean'),
             avg_snr=('bgtw_snr', 'mean'),
             pckt_nr=('pckt_nr', 'sum'),
-        ).reset_index()
+        )
+
+        # Spread and size of each mean, needed for the confidence intervals of sampled data
+        if sample_rate is not None:
+            metrics.update(
+                rssi_std=('bgtw_rssi', 'std'),
+                rssi_n=('bgtw_rssi', 'count'),
+                snr_std=('bgtw_snr', 'std'),
+                snr_n=('bgtw_snr', 'count'),
+            )
+
+        summary_df = df.groupby(group_cols + [pd.Grouper(freq=freq)], observed=True).agg(**metrics).reset_index()
 
         # Round the 'avg_rssi' and 'avg_snr' values to two decimal places
         summary_df['avg_rssi'] = round(summary_df['avg_rssi'], 2)
@@ -615,11 +1171,15 @@ class DataSummaryEngine:
         # Calculate distances between sensors and mesh gateways
         gdf = self.calculate_distance(summary_df)
 
-        # Merge the missing packets DataFrame with the original DataFrame
-        merged_df = pd.merge(gdf, missing_pckt, on=['sensor_id', 'mgtw_id', 'timestamp'], how='left')
+        if sample_rate is None:
+            # Merge the missing packets DataFrame with the original DataFrame
+            merged_df = pd.merge(gdf, missing_pckt, on=['sensor_id', 'mgtw_id', 'timestamp'], how='left')
 
-        # Calculate total_pckts as the sum of pckt_nr and missing_pckts
-        merged_df['total_pckts'] = merged_df['pckt_nr'] + merged_df['missing_pckts']
+            # Calculate total_pckts as the sum of pckt_nr and missing_pckts
+            merged_df['total_pckts'] = merged_df['pckt_nr'] + merged_df['missing_pckts']
+
+        else:
+            merged_df = self.add_sample_estimates(gdf, sample_rate, confidence)
 
 
         merged_df.drop(["geometry","bgtw_id","pckt_nr", "sensor_long", "sensor_lat", "mgtw_lat", "mgtw_long"], axis=1, inplace=True)
@@ -627,15 +1187,308 @@ class DataSummaryEngine:
         # Calculate packet loss percentage
         merged_df['pckt_error_rate'] = round((merged_df['missing_pckts'] / merged_df['total_pckts'])*100,2)
 
+        if include_silent and sample_rate is None:
+            merged_df = self.merge_expected_pckts(merged_df, expected_pckt, ['sensor_id', 'mgtw_id', 'timestamp'])
+
         merged_df = merged_df.sort_values(by=['timestamp','sensor_id', 'mgtw_id'])
 
         return merged_df  # Return summarized DataFrame
+
+    def get_cell_geometry(self, cells, cell_size_m, ref_lat):
+        '''
+        Returns the polygons of the given grid cells, building only the cells not already in the cache.
+
+        Parameters:
+        - cells: pandas MultiIndex of (cell_row, cell_col) pairs.
+        - cell_size_m: Edge length of a grid cell in meters.
+        - ref_lat: Reference latitude used to convert meters to degrees of longitude.
+
+        Returns:
+        - A GeoSeries of cell polygons indexed by (cell_row, cell_col).
+        '''
+        dlat, dlon = self.cell_size_deg(cell_size_m, ref_lat)
+        key = (cell_size_m, ref_lat)
+
+        cached = self.cell_geometry_cache.get(key)
+        new_cells = cells if cached is None else cells.difference(cached.index)
+
+        if len(new_cells) > 0:
+            rows = new_cells.get_level_values('cell_row').to_numpy()
+            cols = new_cells.get_level_values('cell_col').to_numpy()
+
+            # Build all new cell polygons in one vectorized call
+            polygons = shapely.box(cols * dlon, rows * dlat, (cols + 1) * dlon, (rows + 1) * dlat)
+            new_geometry = gpd.GeoSeries(polygons, index=new_cells, crs="EPSG:4326")
+
+            cached = new_geometry if cached is None else pd.concat([cached, new_geometry])
+            self.cell_geometry_cache[key] = cached
+
+        return cached.loc[cells]
+
+    def cell_size_deg(self, cell_size_m, ref_lat):
+        '''
+        Converts a cell edge length in meters to degrees of latitude and longitude.
+
+        Parameters:
+        - cell_size_m: Edge length of a grid cell in meters.
+        - ref_lat: Reference latitude in degrees.
+
+        Returns:
+        - A tuple of (degrees of latitude, degrees of longitude).
+        '''
+        meters_per_deg = 111320.0
+
+        return cell_size_m / meters_per_deg, cell_size_m / (meters_per_deg * np.cos(np.radians(ref_lat)))
+
+    def calculate_coverage_grid(self, df, gtw_col='bgtw_id', cell_size_m=100, to_file=None):
+        '''
+        Bins sensor messages into a regular geographic grid and aggregates PER, RSSI and SNR per cell and gateway.
+        The grid is anchored at 0/0 with a whole-degree reference latitude, so cell ids are stable between runs.
+
+        Parameters:
+        - df: pandas DataFrame containing the raw (cleaned) message data with 'sensor_lat' and 'sensor_long'.
+        - gtw_col: Gateway column to aggregate by, 'bgtw_id' for SN2BG or 'mgtw_id' for SN2MG.
+        - cell_size_m: Edge length of a grid cell in meters.
+        - to_file: Optional; path of the GeoParquet file to write the grid to.
+
+        Returns:
+        - A GeoDataFrame with one polygon per cell and gateway, and its coverage metrics.
+        '''
+        # The summary engine moves 'timestamp' to the index, bring it back as a column
+        if 'timestamp' not in df.columns:
+            df = df.reset_index()
+
+        df = df[df['frameport'] != 99]
+
+        lat = pd.to_numeric(df['sensor_lat'], errors='coerce').to_numpy(dtype=np.float64)
+        long = pd.to_numeric(df['sensor_long'], errors='coerce').to_numpy(dtype=np.float64)
+        located = ~(np.isnan(lat) | np.isnan(long))
+
+        if not located.any():
+            print("Error: No sensor locations found to build the coverage grid.")
+            return None
+
+        # Assign every message to a cell with integer division of its coordinates
+        ref_lat = float(np.round(np.median(lat[located])))
+        dlat, dlon = self.cell_size_deg(cell_size_m, ref_lat)
+
+        # Count gaps per link and calendar day, like count_pckt_error_SN2BG, so the grid PER agrees with the summaries
+        gap_df = pd.DataFrame({
+            'timestamp': pd.to_datetime(df['timestamp']).to_numpy(),
+            'framecount': df['framecount'].to_numpy(),
+            'sensor_id': df['sensor_id'].to_numpy(),
+            gtw_col: df[gtw_col].to_numpy(),
+        })
+        gap_df['date'] = gap_df['timestamp'].dt.floor('D')
+
+        cells_df = pd.DataFrame({
+            'cell_row': np.floor(lat[located] / dlat).astype(np.int64),
+            'cell_col': np.floor(long[located] / dlon).astype(np.int64),
+            gtw_col: df[gtw_col].to_numpy()[located],
+            'sensor_id': df['sensor_id'].to_numpy()[located],
+            'rssi': df['bgtw_rssi'].to_numpy(dtype=np.float64)[located],
+            'snr': df['bgtw_snr'].to_numpy(dtype=np.float64)[located],
+            'missing_pckts': self.count_framecount_gaps(gap_df, ['sensor_id', gtw_col, 'date'])[located],
+        })
+
+        # Aggregate metrics per cell and gateway
+        grid_df = cells_df.groupby(['cell_row', 'cell_col', gtw_col], observed=True).agg(
+            sensor_nr=('sensor_id', 'nunique'),
+            pckt_nr=('rssi', 'size'),
+            missing_pckts=('missing_pckts', 'sum'),
+            avg_rssi=('rssi', 'mean'),
+            avg_snr=('snr', 'mean'),
+        ).reset_index()
+
+        grid_df['avg_rssi'] = round(grid_df['avg_rssi'], 2)
+        grid_df['avg_snr'] = round(grid_df['avg_snr'], 2)
+
+        grid_df['total_pckts'] = grid_df['pckt_nr'] + grid_df['missing_pckts']
+        grid_df['pckt_error_rate'] = round((grid_df['missing_pckts'] / grid_df['total_pckts'])*100,2)
+        grid_df.drop(columns=['pckt_nr'], inplace=True)
+
+        # Attach the (cached) cell polygons
+        cells = pd.MultiIndex.from_frame(grid_df[['cell_row', 'cell_col']])
+        geometry = self.get_cell_geometry(cells.unique(), cell_size_m, ref_lat)
+        grid_gdf = gpd.GeoDataFrame(grid_df, geometry=geometry.reindex(cells).to_numpy(), crs="EPSG:4326")
+
+        if to_file is not None:
+            grid_gdf.to_parquet(to_file)
+
+        return grid_gdf
+
+    def haversine_distance_m(self, lat1, long1, lat2, long2):
+        '''
+        Calculates the great-circle distance between two sets of coordinates with NumPy.
+        Unlike calculate_distance it works on whole arrays at once, at the cost of a spherical earth (error below 0.5%).
+        
+        Parameters:
+        - lat1, long1: Arrays of the first coordinates in degrees.
+        - lat2, long2: Arrays of the second coordinates in degrees.
+        
+        Returns:
+        - A numpy array of distances in meters.
+        '''
+        earth_radius_m = 6371008.8
+
+        lat1, long1, lat2, long2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, long1, lat2, long2))
+
+        a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((long2 - long1) / 2)**2
+
+        return 2 * earth_radius_m * np.arcsin(np.sqrt(a))
+
+    def fit_path_loss(self, df, group_cols=None, d0_m=1.0, sensitivity_dbm=-137.0, fade_margin_db=0.0, confidence=0.95):
+        '''
+        Fits the log-distance path-loss model RSSI = RSSI(d0) - 10 * n * log10(d / d0) + X(sigma) to every group of links at once.
+        All groups are solved together by least squares from per-group sums of the raw per-message RSSI and distance.
+        
+        Parameters:
+        - df: pandas DataFrame containing the raw (cleaned) SN2MG message data, with 'SN2MG_distance_m' or the
+          sensor and mesh gateway coordinates.
+        - group_cols: Optional; columns to fit a model for, defaults to ['generation', 'mgtw_id'].
+          Use ['generation'] to fit one model per gateway generation.
+        - d0_m: Reference distance in meters.
+        - sensitivity_dbm: Receiver sensitivity used to predict the maximum range.
+        - fade_margin_db: Margin kept above the sensitivity when predicting the maximum range.
+        - confidence: Confidence level of the coefficient intervals.
+        
+        Returns:
+        - A pandas DataFrame with, per group, the message count, RSSI(d0), path-loss exponent n, shadowing sigma,
+          their confidence intervals, and the predicted maximum range.
+        '''
+        if group_cols is None:
+            group_cols = ['generation', 'mgtw_id']
+
+        # The summary engine moves 'timestamp' to the index, bring it back as a column
+        if 'timestamp' not in df.columns:
+            df = df.reset_index()
+
+        df = df[df['frameport'] != 99]
+
+        if 'SN2MG_distance_m' in df.columns:
+            distance = pd.to_numeric(df['SN2MG_distance_m'], errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            coords = [pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64) for col in ['sensor_lat', 'sensor_long', 'mgtw_lat', 'mgtw_long']]
+            distance = self.haversine_distance_m(*coords)
+
+        rssi = pd.to_numeric(df['bgtw_rssi'], errors='coerce').to_numpy(dtype=np.float64)
+        valid = (distance > 0) & np.isfinite(rssi)
+
+        # Gateway generation from the mesh gateway ID prefix, e.g. 'mg3-9' -> 'Gen 3'
+        keys = {}
+        for col in group_cols:
+            if col == 'generation':
+                codes, uniques = pd.factorize(df['mgtw_id'])
+                keys[col] = ('Gen ' + pd.Index(uniques).astype(str).str[2]).to_numpy()[codes[valid]]
+            else:
+                keys[col] = df[col].to_numpy()[valid]
+
+        x = 10 * np.log10(distance[valid] / d0_m)
+        y = rssi[valid]
+
+        if len(x) == 0:
+            print("Error: No messages with a valid distance and RSSI to fit the path-loss model.")
+            return None
+
+        # Center the data globally so the per-group sums of squares stay well conditioned
+        x_offset, y_offset = x.mean(), y.mean()
+        xc, yc = x - x_offset, y - y_offset
+
+        sums = pd.DataFrame({**keys, 'x': xc, 'y': yc, 'xx': xc * xc, 'xy': xc * yc, 'yy': yc * yc}).groupby(group_cols, observed=True).agg(
+            msg_nr=('x', 'size'),
+            x=('x', 'sum'),
+            y=('y', 'sum'),
+            xx=('xx', 'sum'),
+            xy=('xy', 'sum'),
+            yy=('yy', 'sum'),
+        )
+
+        # Closed-form least squares for all groups at once
+        n = sums['msg_nr'].to_numpy(dtype=np.float64)
+        mean_x, mean_y = sums['x'].to_numpy() / n, sums['y'].to_numpy() / n
+        sxx = sums['xx'].to_numpy() - n * mean_x**2
+        sxy = sums['xy'].to_numpy() - n * mean_x * mean_y
+        syy = sums['yy'].to_numpy() - n * mean_y**2
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where((n > 2) & (sxx > 0), sxy / sxx, np.nan)
+            intercept = (mean_y + y_offset) - slope * (mean_x + x_offset)
+            sigma = np.sqrt(np.clip(syy - slope * sxy, 0, None) / (n - 2))
+
+            se_slope = sigma / np.sqrt(sxx)
+            se_intercept = sigma * np.sqrt(1 / n + (mean_x + x_offset)**2 / sxx)
+
+        # Normal quantile, the groups hold enough messages for the t distribution to converge
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        exponent = -slope
+
+        fit_df = sums[['msg_nr']].reset_index()
+        fit_df['rssi_d0_dbm'] = intercept
+        fit_df['rssi_d0_ci_low'] = intercept - z * se_intercept
+        fit_df['rssi_d0_ci_high'] = intercept + z * se_intercept
+        fit_df['path_loss_exponent'] = exponent
+        fit_df['path_loss_exponent_ci_low'] = exponent - z * se_slope
+        fit_df['path_loss_exponent_ci_high'] = exponent + z * se_slope
+        fit_df['shadowing_std_db'] = sigma
+
+        # Distance at which the median RSSI drops to the sensitivity plus the fade margin,
+        # only reported when the exponent is significantly above 0
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            max_range = d0_m * 10**((intercept - sensitivity_dbm - fade_margin_db) / (10 * exponent))
+        fit_df['max_range_m'] = np.where(fit_df['path_loss_exponent_ci_low'] > 0, max_range, np.nan)
+
+        return fit_df
     
 
 class DataVisualisationEngine:
     def __init__(self):
         pass
 
+    def lttb_downsample(self, x, y, n_out):
+        '''
+        Downsamples a series with the Largest-Triangle-Three-Buckets algorithm, keeping the points that preserve its visual shape.
+
+        Parameters:
+        - x: numpy array of x values (sorted ascending).
+        - y: numpy array of y values.
+        - n_out: Number of points to keep.
+
+        Returns:
+        - A numpy array with the positional indices of the selected points.
+        '''
+        n = len(x)
+
+        # Nothing to reduce if the series is already small enough
+        if n_out >= n or n_out < 3:
+            return np.arange(n)
+
+        # Bucket edges for the n - 2 inner points, the first and last points are always kept
+        edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+        selected = np.empty(n_out, dtype=np.int64)
+        selected[0] = 0
+        selected[-1] = n - 1
+
+        # Average point of every bucket, used as the third vertex of the triangle
+        starts, ends = edges[:-1], edges[1:]
+        counts = ends - starts
+        cum_x = np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+        cum_y = np.concatenate(([0.0], np.cumsum(y, dtype=np.float64)))
+        avg_x = (cum_x[ends] - cum_x[starts]) / counts
+        avg_y = (cum_y[ends] - cum_y[starts]) / counts
+        avg_x = np.append(avg_x[1:], x[-1])
+        avg_y = np.append(avg_y[1:], y[-1])
+
+        # Keep the point of each bucket forming the largest triangle with the previous pick and the next bucket average
+        prev = 0
+        for i in range(n_out - 2):
+            bx = x[starts[i]:ends[i]]
+            by = y[starts[i]:ends[i]]
+            area = np.abs((x[prev] - avg_x[i]) * (by - y[prev]) - (x[prev] - bx) * (avg_y[i] - y[prev]))
+            prev = starts[i] + int(np.argmax(area))
+            selected[i + 1] = prev
+
+        return selected
+
     def create_SN2BG_subplot(self, df):
         # Get unique values for the 'bgtw_id' column for the legend
         unique_bgtw_ids = df['bgtw_id'].unique()
@@ -765,6 +1618,262 @@ class DataVisualisationEngine:
             # Display subplot
             plt.show()
 
+    def create_raw_timeseries_plot(self, df, gtw_col='bgtw_id', n_out=2000, to_file=None):
+        '''
+        Plots the raw per-message RSSI, SNR and framecount gaps of every sensor and gateway link over time.
+        Each link is downsampled with LTTB so the render time and file size do not grow with the date range.
+
+        Parameters:
+        - df: pandas DataFrame containing the raw (cleaned) message data.
+        - gtw_col: Gateway column defining the link, 'bgtw_id' for SN2BG or 'mgtw_id' for SN2MG.
+        - n_out: Maximum number of points drawn per link and attribute.
+        - to_file: Optional; path of the image file to save the figure to.
+
+        Returns:
+        - The matplotlib Figure.
+        '''
+        # The summary engine moves 'timestamp' to the index, bring it back as a column
+        if 'timestamp' not in df.columns:
+            df = df.reset_index()
+
+        df = df.loc[df['frameport'] != 99, ['sensor_id', gtw_col, 'timestamp', 'bgtw_rssi', 'bgtw_snr', 'framecount']].copy()
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df = df.sort_values(['sensor_id', gtw_col, 'timestamp'], kind='stable')
+
+        # Packets lost between two consecutive messages of the same link, with the same reset rule as the summaries
+        new_link = (df['sensor_id'].ne(df['sensor_id'].shift()) | df[gtw_col].ne(df[gtw_col].shift())).to_numpy()
+        gaps = DataSummaryEngine().count_framecount_gaps(df, ['sensor_id', gtw_col]).astype(np.float64)
+        gaps[new_link] = np.nan
+        df['framecount_gap'] = gaps
+
+        y_attributes = ['bgtw_rssi', 'bgtw_snr', 'framecount_gap']
+        y_labels = ['RSSI [dBm]', 'SNR [dB]', 'Framecount gap [pckts]']
+
+        fig, axes = plt.subplots(len(y_attributes), 1, figsize=(14, 10), sharex=True)
+
+        # Create a custom palette that matches the unique links
+        links = df[['sensor_id', gtw_col]].drop_duplicates().itertuples(index=False, name=None)
+        link_bounds = np.flatnonzero(np.append(new_link, True))
+        palette = sns.color_palette('Set1', n_colors=max(len(link_bounds) - 1, 1))
+
+        x_all = df['timestamp'].to_numpy(dtype='datetime64[ns]')
+        y_all = {y_attr: df[y_attr].to_numpy(dtype=np.float64) for y_attr in y_attributes}
+
+        for i, (sensor_id, gtw_id) in enumerate(links):
+            start, end = link_bounds[i], link_bounds[i + 1]
+            x_link = x_all[start:end]
+
+            for ax, y_attr in zip(axes, y_attributes):
+                y = y_all[y_attr][start:end]
+                valid = ~np.isnan(y)
+                x_valid, y_valid = x_link[valid], y[valid]
+
+                # Downsample on the numeric time axis, then draw only the kept points
+                keep = self.lttb_downsample(x_valid.astype(np.int64).astype(np.float64), y_valid, n_out)
+                ax.plot(x_valid[keep], y_valid[keep], color=palette[i], linewidth=0.8, label=f'{sensor_id} - {gtw_id}')
+
+        # Set axis labels
+        for ax, y_label in zip(axes, y_labels):
+            ax.set_ylabel(y_label)
+            ax.grid(alpha=0.3)
+
+        axes[-1].set_xlabel('Timestamp')
+        fig.suptitle('Raw RSSI, SNR and Framecount Gaps by Sensor ID and Gateway ID Over Time', fontsize=14)
+
+        # Add legend and place it outside the plot
+        axes[0].legend(title='Sensor ID - Gateway ID', bbox_to_anchor=(1.01, 1), loc='upper left')
+
+        # Adjust layout to avoid overlap
+        fig.tight_layout()
+
+        if to_file is not None:
+            fig.savefig(to_file, bbox_inches='tight')
+
+        plt.show()
+
+        return fig
+
+
+class LinkWindow:
+    # Ring buffers and running sums of the last messages of one (sensor, gateway) link
+    __slots__ = ('rssi', 'snr', 'lost', 'pos', 'count', 'rssi_sum', 'snr_sum', 'lost_sum', 'last_framecount', 'alerts')
+
+    def __init__(self, window):
+        self.rssi = [0.0] * window
+        self.snr = [0.0] * window
+        self.lost = [0] * window
+        self.pos = 0
+        self.count = 0
+        self.rssi_sum = 0.0
+        self.snr_sum = 0.0
+        self.lost_sum = 0
+        self.last_framecount = None
+        self.alerts = set()
+
+
+class LinkHealthMonitorEngine:
+    def __init__(self, window=100, per_threshold=10.0, rssi_threshold=-120.0, snr_threshold=-15.0, min_pckts=20):
+        '''
+        Monitors the health of every (sensor, gateway) link over a sliding window of its last received messages.
+        
+        Parameters:
+        - window: Number of received messages in the sliding window of each link.
+        - per_threshold: PER [%] above which a link is reported as degraded.
+        - rssi_threshold: Average RSSI [dBm] below which a link is reported as degraded.
+        - snr_threshold: Average SNR [dB] below which a link is reported as degraded.
+        - min_pckts: Number of received messages needed before a link is evaluated.
+        '''
+        self.window = window
+        self.per_threshold = per_threshold
+        self.rssi_threshold = rssi_threshold
+        self.snr_threshold = snr_threshold
+        self.min_pckts = min_pckts
+
+        self.links = {}
+
+    def update(self, sensor_id, gtw_id, framecount, rssi, snr, timestamp=None):
+        '''
+        Adds one received message to the window of its link in O(1) and checks the thresholds.
+        
+        Parameters:
+        - sensor_id: Sensor ID of the message.
+        - gtw_id: Gateway ID of the message.
+        - framecount: Framecount of the message.
+        - rssi: RSSI of the message [dBm].
+        - snr: SNR of the message [dB].
+        - timestamp: Optional; timestamp of the message, copied to the emitted events.
+        
+        Returns:
+        - A list of threshold-crossing events (dictionaries), or None if the link state did not change.
+        '''
+        link = self.links.get((sensor_id, gtw_id))
+        if link is None:
+            link = self.links[(sensor_id, gtw_id)] = LinkWindow(self.window)
+
+        # Packets lost since the previous message, handling resets like count_pckt_error_SN2BG
+        previous = link.last_framecount
+        if previous is None:
+            lost = 0
+        elif framecount < previous:
+            lost = 1 if framecount == 4 else max(framecount - 4 - 1, 0)
+        else:
+            lost = max(framecount - previous - 1, 0)
+        link.last_framecount = framecount
+
+        # Replace the oldest message of the window and update the running sums
+        pos = link.pos
+        if link.count == self.window:
+            link.rssi_sum += rssi - link.rssi[pos]
+            link.snr_sum += snr - link.snr[pos]
+            link.lost_sum += lost - link.lost[pos]
+        else:
+            link.count += 1
+            link.rssi_sum += rssi
+            link.snr_sum += snr
+            link.lost_sum += lost
+
+        link.rssi[pos] = rssi
+        link.snr[pos] = snr
+        link.lost[pos] = lost
+
+        pos += 1
+        if pos == self.window:
+            pos = 0
+            # Recompute the float sums once per full turn to stop rounding errors from accumulating
+            link.rssi_sum = sum(link.rssi)
+            link.snr_sum = sum(link.snr)
+        link.pos = pos
+
+        count = link.count
+        if count < self.min_pckts:
+            return None
+
+        per = link.lost_sum * 100 / (count + link.lost_sum)
+        avg_rssi = link.rssi_sum / count
+        avg_snr = link.snr_sum / count
+        alerts = link.alerts
+
+        # Fast path: nothing crosses a threshold, which is the case for almost every message
+        if ((per > self.per_threshold) == ('pckt_error_rate' in alerts)
+                and (avg_rssi < self.rssi_threshold) == ('avg_rssi' in alerts)
+                and (avg_snr < self.snr_threshold) == ('avg_snr' in alerts)):
+            return None
+
+        metrics = (
+            ('pckt_error_rate', per, self.per_threshold, per > self.per_threshold),
+            ('avg_rssi', avg_rssi, self.rssi_threshold, avg_rssi < self.rssi_threshold),
+            ('avg_snr', avg_snr, self.snr_threshold, avg_snr < self.snr_threshold),
+        )
+
+        # Emit an event only when a metric crosses its threshold, in either direction
+        events = []
+        for metric, value, threshold, degraded in metrics:
+            if degraded != (metric in alerts):
+                if degraded:
+                    alerts.add(metric)
+                else:
+                    alerts.discard(metric)
+
+                events.append({'timestamp': timestamp, 'sensor_id': sensor_id, 'gtw_id': gtw_id, 'metric': metric,
+                               'value': round(value, 2), 'threshold': threshold, 'event': 'degraded' if degraded else 'recovered'})
+
+        return events
+
+    def replay(self, df, gtw_col='bgtw_id'):
+        '''
+        Replays the messages of a DataFrame through the monitor in time order.
+        
+        Parameters:
+        - df: pandas DataFrame containing the raw (cleaned) message data.
+        - gtw_col: Gateway column defining the link, 'bgtw_id' for SN2BG or 'mgtw_id' for SN2MG.
+        
+        Returns:
+        - A pandas DataFrame with the emitted threshold-crossing events.
+        '''
+        # The summary engine moves 'timestamp' to the index, bring it back as a column
+        if 'timestamp' not in df.columns:
+            df = df.reset_index()
+
+        df = df[df['frameport'] != 99].sort_values('timestamp', kind='stable')
+
+        # Plain Python lists are the fastest to iterate message by message, timestamps travel as integer nanoseconds
+        columns = [df[col].tolist() for col in ['sensor_id', gtw_col, 'framecount', 'bgtw_rssi', 'bgtw_snr']]
+        columns.append(pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[ns]').view(np.int64).tolist())
+
+        events = []
+        update = self.update
+        for sensor_id, gtw_id, framecount, rssi, snr, timestamp in zip(*columns):
+            link_events = update(sensor_id, gtw_id, framecount, rssi, snr, timestamp)
+            if link_events:
+                events.extend(link_events)
+
+        events_df = pd.DataFrame(events, columns=['timestamp', 'sensor_id', 'gtw_id', 'metric', 'value', 'threshold', 'event'])
+        events_df['timestamp'] = pd.to_datetime(events_df['timestamp'])
+
+        return events_df
+
+    def status(self):
+        '''
+        Returns the current rolling metrics of every monitored link.
+        
+        Returns:
+        - A pandas DataFrame with the rolling PER, average RSSI and SNR, and active alerts per link.
+        '''
+        rows = []
+        for (sensor_id, gtw_id), link in self.links.items():
+            rows.append({
+                'sensor_id': sensor_id,
+                'gtw_id': gtw_id,
+                'pckt_nr': link.count,
+                'missing_pckts': link.lost_sum,
+                'pckt_error_rate': round(link.lost_sum * 100 / (link.count + link.lost_sum), 2),
+                'avg_rssi': round(link.rssi_sum / link.count, 2),
+                'avg_snr': round(link.snr_sum / link.count, 2),
+                'alerts': sorted(link.alerts),
+            })
+
+        return pd.DataFrame(rows)
+
 
 class DataPipelineEngine:
     def __init__(self):
@@ -773,8 +1882,11 @@ class DataPipelineEngine:
         self.data_cleaning_engine = DataCleaningEngine()
         self.data_summarizing_engine = DataSummaryEngine()
         self.data_visualisation_engine = DataVisualisationEngine()
+
+        # Status of each chunk of the last checkpointed extraction
+        self.chunk_report = None
         
-    def run_pipeline(self, username,password,sensor_list, gtw_list, date_range, gtw_type, freq, to_file=None):
+    def run_pipeline(self, username,password,sensor_list, gtw_list, date_range, gtw_type, freq, to_file=None, arrow=False, sample_rate=None, checkpoint_dir=None, include_silent=False):
         '''
         Runs the entire data pipeline, including extraction, cleaning, and summarizing.
         
@@ -784,6 +1896,11 @@ class DataPipelineEngine:
         - sensor_list: List of sensor IDs.
         - gtw_list: Optional; List of gateway IDs (either as strings or integers).
         - date_range: List of two dates specifying the start and end of the range.
+        - arrow: Optional; if True, extracts the data through Arrow with typed, dictionary-encoded columns.
+        - sample_rate: Optional; fraction of rows (0-1] sampled server-side for a quick-look summary without PER.
+        - checkpoint_dir: Optional; directory to checkpoint the extraction in chunks, so a rerun resumes from the completed chunks.
+          The status of each chunk is kept in self.chunk_report.
+        - include_silent: Optional; if True, the summary also reports expected packets and the PER including silent tails and outages.
         
         Returns:
         - Returns a tuple of (raw DataFrame, summarized DataFrame).
@@ -795,11 +1912,14 @@ class DataPipelineEngine:
             
             else:
                 # Run the entire data pipeline: extraction, cleaning, and summary
-                temp_df = self.data_extraction_engine.get_snowflake_SN2BG(username,password,sensor_list, gtw_list, date_range)  # Load Data
+                if checkpoint_dir is None:
+                    temp_df = self.data_extraction_engine.get_snowflake_SN2BG(username,password,sensor_list, gtw_list, date_range, arrow=arrow, sample_rate=sample_rate)  # Load Data
+                else:
+                    temp_df, self.chunk_report = self.data_extraction_engine.get_snowflake_chunked(username,password,sensor_list, gtw_list, date_range, gtw_type, checkpoint_dir, arrow=arrow, sample_rate=sample_rate)
                         
                 SN2BG = self.data_cleaning_engine.clean_SN2BG(temp_df)  # Clean Data
 
-                SN2BG_summary = self.data_summarizing_engine.calculate_SN2BG_summary(SN2BG, freq)  # Calculate summary metrics
+                SN2BG_summary = self.data_summarizing_engine.calculate_SN2BG_summary(SN2BG, freq, sample_rate=sample_rate, include_silent=include_silent, date_range=date_range)  # Calculate summary metrics
 
                 self.data_visualisation_engine.create_SN2BG_subplot(SN2BG_summary)
 
@@ -820,11 +1940,14 @@ class DataPipelineEngine:
 
             else:
 
-                temp_df = self.data_extraction_engine.get_snowflake_SN2MG(username,password,sensor_list, gtw_list, date_range)
+                if checkpoint_dir is None:
+                    temp_df = self.data_extraction_engine.get_snowflake_SN2MG(username,password,sensor_list, gtw_list, date_range, arrow=arrow, sample_rate=sample_rate)
+                else:
+                    temp_df, self.chunk_report = self.data_extraction_engine.get_snowflake_chunked(username,password,sensor_list, gtw_list, date_range, gtw_type, checkpoint_dir, arrow=arrow, sample_rate=sample_rate)
 
                 SN2MG = self.data_cleaning_engine.clean_SN2Mesh(temp_df)
 
-                SN2MG_summary = self.data_summarizing_engine.calculate_SN2MG_summary(SN2MG, freq)
+                SN2MG_summary = self.data_summarizing_engine.calculate_SN2MG_summary(SN2MG, freq, sample_rate=sample_rate, include_silent=include_silent, date_range=date_range)
 
                 self.data_visualisation_engine.create_SN2MG_subplot(SN2MG_summary)
 